@@ -1,14 +1,47 @@
 """Main module for mapping FAQ from Gladly to Shopify"""
 
+import csv
+import os
 import re
-from typing import Dict, List, Optional
+import string
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
 from gladly_client import GladlyClient
 from shopify_client import ShopifyFAQClient
 from config import MAPPING_CONFIG
-from rapidfuzz import fuzz, process
 import json
 from datetime import datetime
-import pandas as pd
+
+_HANDLE_KEEP = frozenset(string.ascii_lowercase + string.digits)
+
+
+class _HandleTable(dict):
+    """Translation table for str.translate, filled lazily per character:
+    [a-z0-9] are kept, whitespace becomes '-', everything else is dropped"""
+
+    def __missing__(self, codepoint: int):
+        char = chr(codepoint)
+        if char in _HANDLE_KEEP:
+            value = char
+        elif char.isspace():
+            value = '-'
+        else:
+            value = None
+        self[codepoint] = value
+        return value
+
+
+_HANDLE_TABLE = _HandleTable()
+_HANDLE_DASHES = re.compile(r'-+')
+
+@lru_cache(maxsize=4096)
+def _generate_handle(title: str) -> str:
+    """Pure handle computation, memoized since titles repeat across languages and runs"""
+    # Convert to lowercase and replace spaces/special chars with hyphens
+    handle = _HANDLE_DASHES.sub('-', title.lower().translate(_HANDLE_TABLE)).strip('-')
+    
+    # Limit length
+    return handle[:50].rstrip('-') or "faq-question"
 
 class FAQMapper:
     """Maps and synchronizes FAQ between Gladly and Shopify"""
@@ -17,6 +50,24 @@ class FAQMapper:
         self.gladly_client = GladlyClient()
         self.shopify_client = ShopifyFAQClient()
         self.config = MAPPING_CONFIG
+        # Mapping chargé une seule fois et indexé, partagé entre les langues
+        self._mapping_store: Optional["MappingStore"] = None
+        self._mapping_file = None
+        # Ajouts Shopify en attente, envoyés en un seul PUT par flush_pending()
+        self._pending_adds: List[Dict] = []
+    
+    def _ensure_mapping(self, mapping_file: str) -> "MappingStore":
+        """Load the mapping file once and keep it indexed"""
+        if self._mapping_store is None or self._mapping_file != mapping_file:
+            self._mapping_store = MappingStore(load_mapping(mapping_file))
+            self._mapping_file = mapping_file
+        return self._mapping_store
+    
+    def flush_pending(self) -> bool:
+        """Write all pending FAQ additions to Shopify in a single asset update"""
+        pending, self._pending_adds = self._pending_adds, []
+        # Un seul GET, une seule sauvegarde et un seul PUT pour tout le lot
+        return self.shopify_client.bulk_add_faq_questions(pending)
     
     def clean_html_content(self, content: str) -> str:
         """Clean and format HTML content for Shopify"""
@@ -24,33 +75,28 @@ class FAQMapper:
             return ""
         
         # Basic HTML cleaning - you can extend this as needed
-        content = content.strip()
+        # Only strip when needed: API payloads are usually already trimmed
+        if content[0].isspace() or content[-1].isspace():
+            content = content.strip()
+            if not content:
+                return ""
         
         # Ensure content is wrapped in <p> tags if not already
-        if not content.startswith('<') and content:
+        if content[0] != '<':
             content = f"<p>{content}</p>"
         
         return content
     
     def generate_question_handle(self, title: str) -> str:
         """Generate a unique handle from the question title"""
-        # Convert to lowercase and replace spaces/special chars with hyphens
-        handle = re.sub(r'[^a-zA-Z0-9\s]', '', title.lower())
-        handle = re.sub(r'\s+', '-', handle)
-        handle = handle.strip('-')
-        
-        # Limit length
-        if len(handle) > 50:
-            handle = handle[:50].rstrip('-')
-        
-        return handle or "faq-question"
+        return _generate_handle(title)
     
     def map_gladly_to_shopify_format(self, gladly_item: Dict) -> Dict:
         """Convert Gladly FAQ item to Shopify format"""
         # Extract relevant fields from Gladly item
         # Adjust these field names based on actual Gladly API response structure
-        title = gladly_item.get('title', gladly_item.get('question', 'FAQ Question'))
-        content = gladly_item.get('answer', gladly_item.get('content', ''))
+        title = gladly_item.get('title') or gladly_item.get('question') or 'FAQ Question'
+        content = gladly_item.get('answer') or gladly_item.get('content') or ''
         
         # Generate handle
         handle = self.generate_question_handle(title)
@@ -66,9 +112,7 @@ class FAQMapper:
         }
     
     def map_questions(self, gladly_faqs, bosapin_faqs, mapping_file):
-        mapping = load_mapping(mapping_file)
-        gladly_question_to_mapping = {m["gladly_question"]: m for m in mapping}
-        bosapin_heading_to_mapping = {m["bosapin_heading"]: m for m in mapping}
+        gladly_question_to_mapping = self._ensure_mapping(mapping_file).by_question
 
         results = []
         for gfaq in gladly_faqs:
@@ -104,24 +148,28 @@ class FAQMapper:
                     all_bosapin_faqs.append(faq)
         return all_bosapin_faqs
     
-    def sync_language_faqs(self, language: str = "fr-ca", dry_run: bool = True, filter_keywords: List[str] = None, mapping_file: str = "mapping.csv") -> Dict:
+    def sync_language_faqs(self, language: str = "fr-ca", dry_run: bool = True, filter_keywords: List[str] = None, mapping_file: str = "mapping.csv", faqs: Optional[List[Dict]] = None, save: bool = True) -> Dict:
         print(f"🔄 Starting FAQ sync for language: {language}")
-        mapping = load_mapping(mapping_file)
-        mapping_by_id = {m["gladly_id"]: m for m in mapping}
+        # Horodatage unique pour toutes les lignes touchées par cette synchronisation
+        sync_ts = datetime.now().isoformat()
+        store = self._ensure_mapping(mapping_file)
+        mapping_by_id = store.by_id
 
-        # Get FAQ data from Gladly
-        gladly_faqs = self.gladly_client.get_answers(language)
+        # Get FAQ data from Gladly, unless already provided (e.g. search results)
+        gladly_faqs = faqs if faqs is not None else self.gladly_client.get_answers(language)
         if not gladly_faqs:
             print(f"⚠️  No FAQ data found in Gladly for {language}")
             return {"success": False, "error": "No data from Gladly"}
 
         # Filter by keywords if provided
         if filter_keywords:
+            # Une seule alternation compilée au lieu de K recherches par FAQ
+            keywords_pattern = re.compile("|".join(re.escape(keyword.lower()) for keyword in filter_keywords))
             filtered_faqs = []
             for faq in gladly_faqs:
-                title = faq.get('title', faq.get('question', '')).lower()
-                content = faq.get('answer', faq.get('content', '')).lower()
-                if any(keyword.lower() in title or keyword.lower() in content for keyword in filter_keywords):
+                title = (faq.get('title') or faq.get('question') or '').lower()
+                content = (faq.get('answer') or faq.get('content') or '').lower()
+                if keywords_pattern.search(title) or keywords_pattern.search(content):
                     filtered_faqs.append(faq)
             gladly_faqs = filtered_faqs
             print(f"📋 Filtered to {len(gladly_faqs)} FAQs containing keywords: {filter_keywords}")
@@ -136,6 +184,8 @@ class FAQMapper:
             "skipped": 0,
             "errors": []
         }
+        # Entrées de mapping à ajouter une fois les ajouts Shopify envoyés
+        pending_entries = []
 
         for gladly_faq in gladly_faqs:
             try:
@@ -151,9 +201,9 @@ class FAQMapper:
                             print(f"[DRY RUN] À mettre à jour: {gladly_question}")
                         else:
                             print(f"🔄 Mise à jour: {gladly_question}")
-                            mapping_entry["gladly_question"] = gladly_question
+                            store.set_question(mapping_entry, gladly_question)
                             mapping_entry["gladly_answer"] = gladly_answer
-                            mapping_entry["updated_time"] = datetime.now().isoformat()
+                            mapping_entry["updated_time"] = sync_ts
                         results["updated"] += 1
                     else:
                         print(f"⏭️  Skipping (no change): {gladly_question}")
@@ -164,27 +214,25 @@ class FAQMapper:
                         print(f"[DRY RUN] Would add new FAQ: {gladly_question}")
                     else:
                         print(f"➕ Ajout: {gladly_question}")
-                        success = self.shopify_client.add_faq_question(
-                            question_handle=self.generate_question_handle(gladly_question),
-                            heading=gladly_question,
-                            content=gladly_answer,
-                            category=self.config.get('default_category'),
-                            icon=self.config.get('default_icon'),
-                            section_id='faq_questions_VHRPQY'
-                        )
-                        if not success:
-                            results["errors"].append(f"Failed to add: {gladly_question}")
-                            continue
-                    # Ajout dans le mapping
-                    mapping.append({
-                        "gladly_id": gladly_id,
-                        "bosapin_handle": "",
-                        "shopify_question": gladly_question,
-                        "gladly_question": gladly_question,
-                        "shopify_answer": "",
-                        "gladly_answer": gladly_answer,
-                        "updated_time": datetime.now().isoformat()
-                    })
+                        self._pending_adds.append({
+                            "question_handle": self.generate_question_handle(gladly_question),
+                            "heading": gladly_question,
+                            "content": gladly_answer,
+                            "category": self.config.get('default_category'),
+                            "icon": self.config.get('default_icon'),
+                            "section_id": 'faq_questions_VHRPQY'
+                        })
+                        # Ajout dans le mapping après le flush (le cache n'est pas modifié en dry run)
+                        pending_entries.append({
+                            "gladly_id": gladly_id,
+                            "bosapin_handle": "",
+                            "shopify_question": gladly_question,
+                            "gladly_question": gladly_question,
+                            "shopify_answer": "",
+                            "gladly_answer": gladly_answer,
+                            "updated_time": sync_ts
+                        })
+                        continue
                     results["added"] += 1
                 results["processed"] += 1
             except Exception as e:
@@ -192,17 +240,29 @@ class FAQMapper:
                 print(f"❌ {error_msg}")
                 results["errors"].append(error_msg)
 
+        # Envoi groupé des nouvelles FAQ, un seul aller-retour Shopify
+        if pending_entries:
+            if self.flush_pending():
+                for entry in pending_entries:
+                    store.add(entry)
+                results["added"] += len(pending_entries)
+                results["processed"] += len(pending_entries)
+            else:
+                results["errors"].extend(f"Failed to add: {entry['gladly_question']}" for entry in pending_entries)
+
         # Après la boucle principale
         gladly_ids_present = {faq.get("id") for faq in gladly_faqs}
-        ids_in_mapping = {m["gladly_id"] for m in mapping}
+        ids_in_mapping = {m["gladly_id"] for m in store.rows}
         ids_to_remove = ids_in_mapping - gladly_ids_present
 
         # Index Shopify: {question_handle: section_id}
         shopify_questions = self.shopify_client.list_faq_questions()
         handle_to_section = {q["question_handle"]: q["section_id"] for q in shopify_questions}
 
+        # Suppressions regroupées par section : un seul GET, une sauvegarde et un PUT par section
+        entries_by_section: Dict[str, List[Dict]] = {}
         for gid in ids_to_remove:
-            entry = next((m for m in mapping if m["gladly_id"] == gid), None)
+            entry = mapping_by_id.get(gid)
             if entry:
                 question_handle = entry["bosapin_handle"]
                 section_id = handle_to_section.get(question_handle)
@@ -213,11 +273,16 @@ class FAQMapper:
                     print(f"[DRY RUN] À supprimer de Shopify: {entry['gladly_question']} (handle: {question_handle}, section: {section_id})")
                 else:
                     print(f"🗑️ Suppression Shopify: {entry['gladly_question']} (handle: {question_handle}, section: {section_id})")
-                    self.shopify_client.remove_faq_question(question_handle, section_id)
-                mapping.remove(entry)
+                    entries_by_section.setdefault(section_id, []).append(entry)
 
-        if not dry_run:
-            save_mapping(mapping, mapping_file)
+        for section_id, entries in entries_by_section.items():
+            self.shopify_client.bulk_remove_faq_questions([entry["bosapin_handle"] for entry in entries], section_id)
+            for entry in entries:
+                store.remove(entry)
+
+        if not dry_run and save:
+            store.save(mapping_file)
+            self.gladly_client.invalidate()
 
         print(f"\n📊 Sync Results for {language}:")
         print(f"   Processed: {results['processed']}")
@@ -229,7 +294,8 @@ class FAQMapper:
         return results
     
     def sync_all_languages(self, dry_run: bool = True, 
-                          filter_keywords: List[str] = None) -> Dict:
+                          filter_keywords: List[str] = None,
+                          mapping_file: str = "mapping.csv") -> Dict:
         """Sync FAQ for all supported languages"""
         print("🌍 Starting multi-language FAQ sync")
         
@@ -241,8 +307,13 @@ class FAQMapper:
             "total_errors": 0
         }
         
-        for language in self.gladly_client.config["supported_languages"]:
-            result = self.sync_language_faqs(language, dry_run, filter_keywords)
+        # Récupération Gladly en parallèle (I/O réseau), le reste reste séquentiel
+        answers_by_language = self.gladly_client.get_all_languages_data()
+        
+        for language, faqs in answers_by_language.items():
+            # Le mapping en cache est réutilisé d'une langue à l'autre, sauvegardé une seule fois
+            result = self.sync_language_faqs(language, dry_run, filter_keywords, mapping_file,
+                                             faqs=faqs, save=False)
             all_results["languages"][language] = result
             
             if result["success"]:
@@ -252,6 +323,10 @@ class FAQMapper:
             else:
                 all_results["success"] = False
         
+        if not dry_run:
+            self._ensure_mapping(mapping_file).save(mapping_file)
+            self.gladly_client.invalidate()
+        
         print(f"\n🎯 Overall Sync Results:")
         print(f"   Total Processed: {all_results['total_processed']}")
         print(f"   Total Added: {all_results['total_added']}")
@@ -272,51 +347,144 @@ class FAQMapper:
             return {"success": False, "error": "No search results found"}
         
         # Use the sync method with the search results
-        # We'll temporarily replace the get_answers method result
-        original_get_answers = self.gladly_client.get_answers
-        self.gladly_client.get_answers = lambda lang: search_results if lang == language else []
-        
-        try:
-            result = self.sync_language_faqs(language, dry_run)
-            result["search_query"] = search_query
-            return result
-        finally:
-            # Restore original method
-            self.gladly_client.get_answers = original_get_answers
+        result = self.sync_language_faqs(language, dry_run, faqs=search_results)
+        result["search_query"] = search_query
+        return result
 
 def load_mapping(mapping_file):
-    df = pd.read_csv(mapping_file)
-    return df.to_dict(orient="records")
+    with open(mapping_file, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
 
 def save_mapping(mapping, mapping_file):
     if not mapping:
         return
-    df = pd.DataFrame(mapping)
-    df.to_csv(mapping_file, index=False)
-
-def update_mapping(mapping, gladly_question, bosapin_heading, bosapin_handle, score, gladly_id=None, shopify_question=None, shopify_answer=None, gladly_answer=None):
-    from datetime import datetime
-    for m in mapping:
-        if m["gladly_question"] == gladly_question:
-            m["bosapin_heading"] = bosapin_heading
-            m["bosapin_handle"] = bosapin_handle
-            m["score"] = score
-            m["updated_time"] = datetime.now().isoformat()
-            if gladly_id: m["gladly_id"] = gladly_id
-            if shopify_question: m["shopify_question"] = shopify_question
-            if shopify_answer: m["shopify_answer"] = shopify_answer
-            if gladly_answer: m["gladly_answer"] = gladly_answer
+    # Union des clés, dans l'ordre de première apparition
+    fieldnames = list(dict.fromkeys(k for m in mapping for k in m))
+    with open(mapping_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(mapping)
+
+def _read_mapping_header(mapping_file):
+    """Return (fieldnames, ends_with_newline) of an existing mapping file, or None"""
+    if not os.path.exists(mapping_file) or os.path.getsize(mapping_file) == 0:
+        return None
+    with open(mapping_file, newline='', encoding='utf-8') as f:
+        fieldnames = next(csv.reader(f), None)
+    with open(mapping_file, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        ends_with_newline = f.read(1) == b'\n'
+    return fieldnames, ends_with_newline
+
+class MappingStore:
+    """Mapping rows with lookup indices by Gladly question and Gladly ID"""
+
+    def __init__(self, rows: Optional[List[Dict]] = None):
+        # The list is kept by reference so callers see rows appended here
+        self.rows = rows if rows is not None else []
+        self.by_question = {m["gladly_question"]: m for m in self.rows}
+        self.by_id = {m["gladly_id"]: m for m in self.rows}
+        # Changements depuis le dernier save : lignes ajoutées, et gladly_id des lignes existantes modifiées/supprimées
+        self.new_rows: List[Dict] = []
+        self._new_ids: Set[int] = set()
+        self.dirty: Set[str] = set()
+
+    def mark_dirty(self, row: Dict) -> None:
+        """Record that an already-saved row was modified in place"""
+        if id(row) not in self._new_ids:
+            self.dirty.add(row["gladly_id"])
+
+    def add(self, row: Dict) -> None:
+        """Append a row and register it in both indices"""
+        self.rows.append(row)
+        self.by_question[row["gladly_question"]] = row
+        self.by_id[row["gladly_id"]] = row
+        self.new_rows.append(row)
+        self._new_ids.add(id(row))
+
+    def remove(self, row: Dict) -> None:
+        """Remove a row and drop it from both indices"""
+        if id(row) in self._new_ids:
+            self._new_ids.discard(id(row))
+            del self.new_rows[next(i for i, r in enumerate(self.new_rows) if r is row)]
+        else:
+            self.dirty.add(row["gladly_id"])
+        # Par identité : list.remove comparerait par égalité
+        del self.rows[next(i for i, r in enumerate(self.rows) if r is row)]
+        if self.by_question.get(row["gladly_question"]) is row:
+            del self.by_question[row["gladly_question"]]
+        if self.by_id.get(row["gladly_id"]) is row:
+            del self.by_id[row["gladly_id"]]
+
+    def set_question(self, row: Dict, gladly_question: str) -> None:
+        """Change a row's Gladly question and re-index it"""
+        if self.by_question.get(row["gladly_question"]) is row:
+            del self.by_question[row["gladly_question"]]
+        row["gladly_question"] = gladly_question
+        self.by_question[gladly_question] = row
+        self.mark_dirty(row)
+
+    def set_id(self, row: Dict, gladly_id: str) -> None:
+        """Change a row's Gladly ID and re-index it"""
+        if self.by_id.get(row["gladly_id"]) is row:
+            del self.by_id[row["gladly_id"]]
+        self.mark_dirty(row)
+        row["gladly_id"] = gladly_id
+        self.by_id[gladly_id] = row
+
+    def update(self, gladly_question, bosapin_heading, bosapin_handle, score, gladly_id=None, shopify_question=None, shopify_answer=None, gladly_answer=None, updated_time=None):
+        """Update the row for a Gladly question in place, or append a new one"""
+        updated_time = updated_time or datetime.now().isoformat()
+        row = self.by_question.get(gladly_question)
+        if row is not None:
+            row["bosapin_heading"] = bosapin_heading
+            row["bosapin_handle"] = bosapin_handle
+            row["score"] = score
+            row["updated_time"] = updated_time
+            self.mark_dirty(row)
+            if gladly_id: self.set_id(row, gladly_id)
+            if shopify_question: row["shopify_question"] = shopify_question
+            if shopify_answer: row["shopify_answer"] = shopify_answer
+            if gladly_answer: row["gladly_answer"] = gladly_answer
+            return
+        # Si pas trouvé, ajoute une nouvelle entrée
+        self.add({
+            "gladly_id": gladly_id or "",
+            "bosapin_handle": bosapin_handle or "",
+            "shopify_question": shopify_question or bosapin_heading or "",
+            "gladly_question": gladly_question or "",
+            "shopify_answer": shopify_answer or "",
+            "gladly_answer": gladly_answer or "",
+            "updated_time": updated_time
+        })
+
+    def save(self, mapping_file: str) -> None:
+        """Write pending changes: append new rows only, or rewrite the file if existing rows changed"""
+        if not self.dirty and not self.new_rows:
             return
-    # Si pas trouvé, ajoute une nouvelle entrée
-    mapping.append({
-        "gladly_id": gladly_id or "",
-        "bosapin_handle": bosapin_handle or "",
-        "shopify_question": shopify_question or bosapin_heading or "",
-        "gladly_question": gladly_question or "",
-        "shopify_answer": shopify_answer or "",
-        "gladly_answer": gladly_answer or "",
-        "updated_time": datetime.now().isoformat()
-    })
+
+        header = None if self.dirty else _read_mapping_header(mapping_file)
+        new_keys = {k for row in self.new_rows for k in row}
+        if header and header[0] and new_keys <= set(header[0]):
+            # Cas courant : uniquement des ajouts, en fin de fichier
+            fieldnames, ends_with_newline = header
+            with open(mapping_file, 'a', newline='', encoding='utf-8') as f:
+                if not ends_with_newline:
+                    f.write('\n')
+                writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator='\n')
+                writer.writerows(self.new_rows)
+        else:
+            # Lignes existantes modifiées/supprimées, ou nouvelles colonnes : réécriture complète
+            save_mapping(self.rows, mapping_file)
+
+        self.new_rows = []
+        self._new_ids = set()
+        self.dirty = set()
+
+def update_mapping(mapping, gladly_question, bosapin_heading, bosapin_handle, score, gladly_id=None, shopify_question=None, shopify_answer=None, gladly_answer=None, updated_time=None):
+    # Accepte un MappingStore, ou une liste de lignes (indexée à la volée)
+    store = mapping if isinstance(mapping, MappingStore) else MappingStore(mapping)
+    store.update(gladly_question, bosapin_heading, bosapin_handle, score, gladly_id, shopify_question, shopify_answer, gladly_answer, updated_time)
 
 if __name__ == "__main__":
     # Example usage
@@ -1,16 +1,23 @@
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
+import numpy as np
 import pandas as pd
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process, utils
 import json
 from config import SHOPIFY_CONFIG, GLADLY_CONFIG
 
+# Session partagée : connexions keep-alive réutilisées entre les appels Gladly et Shopify
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=Retry(total=3, backoff_factor=0.3)))
+
 def get_gladly_data(lng='fr-ca'):
     url = f"https://bosapin.us-1.gladly.com/api/v1/orgs/EZ_-yCNgTn6_ZVaIt_y90g/answers?lng={lng}"
 
     username = GLADLY_CONFIG["username"]
     api_token = GLADLY_CONFIG["api_token"]
-    response = requests.get(url, auth=HTTPBasicAuth(username, api_token))
+    response = _SESSION.get(url, auth=HTTPBasicAuth(username, api_token))
 
     if (response.status_code == 200):
         data = response.json()
@@ -29,7 +36,7 @@ def get_shopify_data():
 
     # === 1. Récupérer le fichier existant ===
     params = {"asset[key]": SHOPIFY_CONFIG["faq_file_path"]}
-    response = requests.get(url, headers=HEADERS, params=params)
+    response = _SESSION.get(url, headers=HEADERS, params=params)
     
     # Vérifier le statut de la réponse
     if response.status_code != 200:
@@ -49,38 +56,99 @@ def get_shopify_data():
     faq_data = json.loads(faq_json_str)
     return faq_data
 
-def create_mapping(gladly_data, shopify_data):
-    all_bosapin_faqs = []
+def token_sort_key(text):
+    """Normalise un texte une seule fois (minuscules, ponctuation, tokens triés)"""
+    return " ".join(sorted(utils.default_process(text).split()))
+
+def iter_shopify_blocks(shopify_data):
+    """Parcourt les blocs FAQ sans copier leurs settings : (section_id, category, block_id, settings)"""
     for section_id, section in shopify_data["sections"].items():
         if "blocks" in section:
             category = section.get("settings", {}).get("question_category", "")
             for block_id, block in section["blocks"].items():
-                faq = dict(block["settings"])  # Copie les settings
-                faq["section_id"] = section_id
-                faq["category"] = category
-                faq["block_id"] = block_id
-                all_bosapin_faqs.append(faq)
+                yield section_id, category, block_id, block["settings"]
+
+def length_candidates(gnorm, bnorm, score_cutoff):
+    """Regroupe les clés Gladly par longueur : (rows, cols) des paires pouvant atteindre le seuil"""
+    # fuzz.ratio(a, b) <= 200 * min / (len(a) + len(b)), les autres paires ne sont jamais scorées
+    glen = np.array([len(k) for k in gnorm])
+    hlen = np.array([len(k) for k in bnorm])
+    for length in np.unique(glen):
+        rows = np.flatnonzero(glen == length)
+        cols = np.flatnonzero(200 * np.minimum(length, hlen) >= score_cutoff * (length + hlen))
+        yield rows, cols
+
+def lsh_candidates(gnorm, bnorm, threshold=0.5, num_perm=128):
+    """Candidats proposés par MinHash LSH (trigrammes de caractères) : (rows, cols) par clé Gladly"""
+    from datasketch import MinHash, MinHashLSH  # dépendance optionnelle, pour les gros corpus
+
+    def minhash(key):
+        m = MinHash(num_perm=num_perm)
+        m.update_batch([key[i:i + 3].encode("utf-8") for i in range(max(1, len(key) - 2))])
+        return m
+
+    lsh = MinHashLSH(threshold=threshold, num_perm=num_perm)
+    for j, key in enumerate(bnorm):
+        lsh.insert(str(j), minhash(key))
+    for i, key in enumerate(gnorm):
+        yield np.array([i]), np.array(sorted(int(j) for j in lsh.query(minhash(key))), dtype=np.intp)
+
+def create_mapping(gladly_data, shopify_data, use_lsh=False):
+    all_bosapin_blocks = list(iter_shopify_blocks(shopify_data))
+
+    names = [g["name"] for g in gladly_data]
+    headings = [settings["heading"] for _, _, _, settings in all_bosapin_blocks]
 
     mapping = []
-    for gfaq in gladly_data:
-        best_match = None
-        best_score = 0
-        for bfaq in all_bosapin_faqs:
-            score = fuzz.token_sort_ratio(gfaq["name"], bfaq["heading"])
-            if score > best_score:
-                best_score = score
-                best_match = bfaq
-        if best_score > 80:  # seuil à ajuster
+    if names and headings:
+        # Clés pré-triées : fuzz.ratio sur ces clés équivaut à token_sort_ratio
+        gnorm = [token_sort_key(n) for n in names]
+        bnorm = [token_sort_key(h) for h in headings]
+
+        score_cutoff = 80  # seuil à ajuster
+
+        # Approximatif mais quasi linéaire (LSH), ou exact par filtre de longueur
+        if use_lsh:
+            candidates = lsh_candidates(gnorm, bnorm)
+        else:
+            candidates = length_candidates(gnorm, bnorm, score_cutoff)
+
+        best_idx = np.zeros(len(names), dtype=np.intp)
+        best_score = np.zeros(len(names), dtype=np.uint8)
+
+        # Une matrice de scores par groupe de clés Gladly, sur leurs seuls candidats
+        for rows, cols in candidates:
+            if not len(cols):
+                continue
+
+            # Calcul en C++ (multi-thread), les scores < score_cutoff valent 0
+            scores = process.cdist([gnorm[i] for i in rows], [bnorm[j] for j in cols],
+                                   scorer=fuzz.ratio, processor=None, workers=-1,
+                                   score_cutoff=score_cutoff, dtype=np.uint8)
+            local_best = scores.argmax(axis=1)
+            best_idx[rows] = cols[local_best]
+            best_score[rows] = scores[np.arange(len(rows)), local_best]
+
+        mask = best_score > score_cutoff
+
+        for i in np.flatnonzero(mask):
             mapping.append({
-                "gladly_id": gfaq["id"],
-                "bosapin_handle": best_match["question_handle"],
-                "score": best_score,
-                
+                "gladly_id": gladly_data[i]["id"],
+                "bosapin_handle": all_bosapin_blocks[best_idx[i]][3]["question_handle"],
+                "score": int(best_score[i]),
+                "block_idx": best_idx[i],
             })
 
- 
-    mapdf = pd.DataFrame(mapping).merge(pd.DataFrame(all_bosapin_faqs), left_on="bosapin_handle", right_on="question_handle", how="left").merge(pd.DataFrame(gladly_data), left_on="gladly_id", right_on="id", how="left")
-    return mapdf
+    # Jointure directe sur le bloc apparié plutôt que deux merges pandas
+    gladly_by_id = {g["id"]: g for g in gladly_data}
+
+    # Mêmes colonnes, dans le même ordre, que mapping ⟕ bosapin ⟕ gladly
+    rows = []
+    for m in mapping:
+        section_id, category, block_id, settings = all_bosapin_blocks[m.pop("block_idx")]
+        rows.append({**m, **settings, "section_id": section_id, "category": category, "block_id": block_id,
+                     **gladly_by_id[m["gladly_id"]]})
+    return pd.DataFrame(rows)
     
 if __name__ == "__main__":
     gladly_data = get_gladly_data()
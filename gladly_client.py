@@ -1,9 +1,12 @@
 """Client for fetching FAQ data from Gladly API"""
 
+import csv
 import requests
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
-from typing import Dict, List, Optional
+from urllib3.util.retry import Retry
+from typing import Dict, Iterable, List, Optional
 from config import GLADLY_CONFIG
 
 
@@ -17,18 +20,46 @@ class GladlyClient:
         self.username = self.config["username"]
         self.api_token = self.config["api_token"]
         self.auth = HTTPBasicAuth(self.username, self.api_token)
+        
+        # Persistent session: keep-alive connections reused across calls
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=10, pool_maxsize=20,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        ))
+        # Answers already fetched during this run, keyed by language
+        self._answers_cache: Dict[str, List[Dict]] = {}
+    
+    def close(self) -> None:
+        """Close the underlying HTTP session"""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def invalidate(self) -> None:
+        """Drop cached answers so the next get_answers call hits the API again"""
+        self._answers_cache.clear()
     
     def get_answers(self, language: str = "fr-ca") -> List[Dict]:
         """Fetch all answers/FAQ from Gladly for a specific language"""
+        if language in self._answers_cache:
+            return self._answers_cache[language]
+        
         url = f"{self.base_url}/api/v1/orgs/{self.org_id}/answers"
         params = {"lng": language}
         
         try:
-            response = requests.get(url, auth=self.auth, params=params)
+            response = self.session.get(url, params=params)
             response.raise_for_status()
             
             data = response.json()
             print(f"✅ Retrieved {len(data)} answers for language: {language}")
+            self._answers_cache[language] = data
             return data
             
         except requests.RequestException as e:
@@ -41,7 +72,7 @@ class GladlyClient:
         params = {"q": query, "lng": language}
         
         try:
-            response = requests.get(url, auth=self.auth, params=params)
+            response = self.session.get(url, params=params)
             response.raise_for_status()
             
             data = response.json()
@@ -54,21 +85,38 @@ class GladlyClient:
     
     def get_all_languages_data(self) -> Dict[str, List[Dict]]:
         """Fetch FAQ data for all supported languages"""
-        all_data = {}
-        
-        for language in self.config["supported_languages"]:
-            all_data[language] = self.get_answers(language)
+        languages = self.config["supported_languages"]
         
-        return all_data
+        # Requests are independent and I/O bound: fetch all languages concurrently
+        with ThreadPoolExecutor(max_workers=max(1, len(languages))) as executor:
+            return dict(zip(languages, executor.map(self.get_answers, languages)))
     
-    def export_to_csv(self, data: List[Dict], filename: str) -> None:
-        """Export FAQ data to CSV file"""
-        if not data:
-            print("⚠️  No data to export")
-            return
+    def export_to_csv(self, data: Iterable[Dict], filename: str,
+                      extra_fields: Optional[Dict] = None,
+                      fieldnames: Optional[List[str]] = None) -> None:
+        """Export FAQ data to CSV file
+        
+        extra_fields are added to every row as it is written, without touching
+        the records. When fieldnames is given, data can be any iterable and is
+        streamed; otherwise the columns are the union of the record keys.
+        """
+        if fieldnames is None:
+            data = list(data)
+            if not data:
+                print("⚠️  No data to export")
+                return
+            # Union of keys, in order of first appearance
+            fieldnames = list(dict.fromkeys(k for row in data for k in row))
+            if extra_fields:
+                fieldnames += [k for k in extra_fields if k not in fieldnames]
         
-        df = pd.DataFrame(data)
-        df.to_csv(filename, index=False)
+        with open(filename, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator="\n")
+            writer.writeheader()
+            if extra_fields:
+                writer.writerows({**row, **extra_fields} for row in data)
+            else:
+                writer.writerows(data)
         print(f"📄 Data exported to {filename}")
     
     def export_all_languages_to_csv(self, output_dir: str = "data") -> None:
@@ -78,27 +126,39 @@ class GladlyClient:
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
         
-        all_data = self.get_all_languages_data()
-        combined_data = []
+        all_data = {language: data for language, data in self.get_all_languages_data().items() if data}
+        if not all_data:
+            return
         
-        for language, data in all_data.items():
-            if data:
-                # Add language info to each record
-                for item in data:
-                    item['language'] = language
-                
-                # Export individual language file
-                filename = os.path.join(output_dir, f"gladly_answers_{language.replace('-', '_')}.csv")
-                self.export_to_csv(data, filename)
-                
-                # Add to combined data
-                combined_data.extend(data)
+        # Combined file written with the union of keys across languages
+        combined_fieldnames = list(dict.fromkeys(k for data in all_data.values() for row in data for k in row))
+        if "language" not in combined_fieldnames:
+            combined_fieldnames.append("language")
+        combined_filename = os.path.join(output_dir, "gladly_answers_all.csv")
         
-        # Export combined file
-        if combined_data:
-            combined_filename = os.path.join(output_dir, "gladly_answers_all.csv")
-            self.export_to_csv(combined_data, combined_filename)
-
+        # Individual language files are independent: write them in worker threads
+        with ThreadPoolExecutor(max_workers=min(8, len(all_data))) as executor:
+            futures = [
+                executor.submit(
+                    self.export_to_csv, data,
+                    os.path.join(output_dir, f"gladly_answers_{language.replace('-', '_')}.csv"),
+                    {"language": language}
+                )
+                for language, data in all_data.items()
+            ]
+            
+            # Combined file stays on the main thread, written while the workers run
+            with open(combined_filename, "w", newline="", encoding="utf-8") as combined_file:
+                combined_writer = csv.DictWriter(combined_file, fieldnames=combined_fieldnames, lineterminator="\n")
+                combined_writer.writeheader()
+                for language, data in all_data.items():
+                    combined_writer.writerows({**item, "language": language} for item in data)
+            
+            # Surface any error raised in a worker
+            for future in futures:
+                future.result()
+        
+        print(f"📄 Data exported to {combined_filename}")
 
 if __name__ == "__main__":
     # Example usage
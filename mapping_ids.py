@@ -1,5 +1,7 @@
 import requests
 import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import uuid
 from datetime import datetime
 import pandas as pd
@@ -18,9 +20,17 @@ HEADERS = {
     "X-Shopify-Access-Token": ACCESS_TOKEN
 }
 
+# Session partagée : connexion keep-alive réutilisée entre le GET et les PUT
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10, pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+
 def get_faq_data():
     params = {"asset[key]": FILE_PATH}
-    response = requests.get(REST_URL, headers=HEADERS, params=params)
+    response = SESSION.get(REST_URL, params=params)
     response.raise_for_status()
     faq_json_str = response.json()["asset"]["value"]
     return json.loads(faq_json_str)
@@ -33,7 +43,7 @@ def backup_faq_data(faq_data):
             "value": json.dumps(faq_data, ensure_ascii=False)
         }
     }
-    response = requests.put(REST_URL, headers=HEADERS, json=backup_payload)
+    response = SESSION.put(REST_URL, json=backup_payload)
     response.raise_for_status()
     print(f"✅ Sauvegarde enregistrée dans : {backup_file_path}")
 
@@ -44,15 +54,21 @@ def update_faq_data(faq_data):
             "value": json.dumps(faq_data, ensure_ascii=False)
         }
     }
-    response = requests.put(REST_URL, headers=HEADERS, json=update_payload)
+    response = SESSION.put(REST_URL, json=update_payload)
     response.raise_for_status()
     print("✅ FAQ mise à jour sur Shopify !")
 
-def update_question_handles_to_gladly_ids(faq_data, mapping_df):
+def update_question_handles_to_gladly_ids(faq_data, mapping_df, verbose=False):
     """
     Met à jour les question_handle des questions Shopify pour utiliser les gladly_id
     """
     updates_made = 0
+    missing = []
+    
+    # Index bosapin_handle -> gladly_id construit une seule fois (première occurrence conservée)
+    lookup = {}
+    for handle, gladly_id in zip(mapping_df["bosapin_handle"].to_numpy(), mapping_df["gladly_id"].to_numpy()):
+        lookup.setdefault(handle, gladly_id)
     
     for section_id, section in faq_data["sections"].items():
         if "blocks" in section:
@@ -61,20 +77,20 @@ def update_question_handles_to_gladly_ids(faq_data, mapping_df):
                     current_handle = block["settings"]["question_handle"]
                     
                     # Chercher le gladly_id correspondant dans le mapping
-                    matching_row = mapping_df[mapping_df["bosapin_handle"] == current_handle]
+                    gladly_id = lookup.get(current_handle)
                     
-                    if not matching_row.empty:
-                        gladly_id = matching_row.iloc[0]["gladly_id"]
-                        old_handle = current_handle
-                        
+                    if gladly_id is not None:
                         # Mettre à jour le question_handle avec le gladly_id
                         block["settings"]["question_handle"] = gladly_id
                         
-                        print(f"✅ Mis à jour: {old_handle} → {gladly_id}")
+                        if verbose:
+                            print(f"✅ Mis à jour: {current_handle} → {gladly_id}")
                         updates_made += 1
                     else:
-                        print(f"⚠️  Pas de mapping trouvé pour: {current_handle}")
+                        missing.append(current_handle)
     
+    if missing:
+        print(f"⚠️  Pas de mapping trouvé pour {len(missing)} question(s): {', '.join(map(str, missing))}")
     print(f"\n🔄 Total des mises à jour: {updates_made}")
     return faq_data
 
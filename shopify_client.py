@@ -1,12 +1,29 @@
 """Client for managing FAQ in Shopify using Admin API"""
 
+import os
 import requests
 import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import uuid
 from datetime import datetime
 from typing import Dict, List, Optional
 from config import SHOPIFY_CONFIG
 
+try:
+    import orjson
+    
+    # orjson encodes/decodes in native code and emits UTF-8 directly
+    def _dumps(data) -> str:
+        return orjson.dumps(data).decode("utf-8")
+    
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(data) -> str:
+        return json.dumps(data, ensure_ascii=False)
+    
+    _loads = json.loads
+
 
 class ShopifyFAQClient:
     """Client to manage FAQ in Shopify theme"""
@@ -26,17 +43,67 @@ class ShopifyFAQClient:
         }
         
         self.rest_url = f"https://{self.store_url}/admin/api/{self.api_version}/themes/{self.theme_id}/assets.json"
+        
+        # Persistent session: keep-alive connections reused across calls
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=10, pool_maxsize=20,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        ))
+        
+        # Parsed FAQ asset, reused until refreshed or replaced by a successful PUT
+        self._faq_cache: Optional[Dict] = None
+        self._faq_etag: Optional[str] = None
+        # JSON text of the cached asset as stored on Shopify, used as-is for backups
+        self._faq_raw: Optional[str] = None
+    
+    def close(self) -> None:
+        """Close the underlying HTTP session"""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def invalidate_faq_cache(self) -> None:
+        """Forget the cached FAQ data so the next read fetches it from Shopify"""
+        self._faq_cache = None
+        self._faq_etag = None
+        self._faq_raw = None
     
-    def get_faq_data(self) -> Optional[Dict]:
-        """Retrieve current FAQ data from Shopify theme"""
+    def _set_faq_cache(self, faq_data: Dict, faq_json_str: str) -> None:
+        """Keep the FAQ data just written to Shopify as the cached copy"""
+        self._faq_cache = faq_data
+        self._faq_raw = faq_json_str
+        self._faq_etag = None  # The asset changed, the previous ETag no longer applies
+    
+    def get_faq_data(self, refresh: bool = False) -> Optional[Dict]:
+        """Retrieve current FAQ data from Shopify theme (cached unless refresh=True)"""
+        if self._faq_cache is not None and not refresh:
+            return self._faq_cache
+        
         params = {"asset[key]": self.file_path}
+        headers = {}
+        if self._faq_cache is not None and self._faq_etag:
+            headers["If-None-Match"] = self._faq_etag
         
         try:
-            response = requests.get(self.rest_url, headers=self.headers, params=params)
+            response = self.session.get(self.rest_url, params=params, headers=headers)
             response.raise_for_status()
             
+            if response.status_code == 304:
+                print("✅ FAQ data unchanged on Shopify")
+                return self._faq_cache
+            
             faq_json_str = response.json()["asset"]["value"]
-            faq_data = json.loads(faq_json_str)
+            faq_data = _loads(faq_json_str)
+            
+            self._faq_cache = faq_data
+            self._faq_raw = faq_json_str
+            self._faq_etag = response.headers.get("ETag")
             
             print(f"✅ Retrieved FAQ data from Shopify")
             return faq_data
@@ -61,7 +128,7 @@ class ShopifyFAQClient:
         }
         
         try:
-            response = requests.put(self.rest_url, headers=self.headers, json=backup_payload)
+            response = self.session.put(self.rest_url, json=backup_payload)
             response.raise_for_status()
             
             print(f"✅ Backup created: {backup_path}")
@@ -71,13 +138,122 @@ class ShopifyFAQClient:
             print(f"❌ Error creating backup: {e}")
             return False
     
+    def backup_faq_data_local(self, faq_data_str: str) -> bool:
+        """Write a backup of current FAQ data to the local backups directory"""
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        backup_dir = self.config.get("backup_dir", "backups")
+        backup_name = os.path.basename(self.file_path).replace(".json", f".backup-{timestamp}.json")
+        backup_path = os.path.join(backup_dir, backup_name)
+        
+        try:
+            os.makedirs(backup_dir, exist_ok=True)
+            with open(backup_path, "w", encoding="utf-8") as f:
+                f.write(faq_data_str)
+            
+            print(f"✅ Local backup created: {backup_path}")
+            return True
+            
+        except OSError as e:
+            print(f"❌ Error creating local backup: {e}")
+            return False
+    
+    def _create_backup(self, backup: Optional[str]) -> bool:
+        """Back up the cached asset text: "none", "local" (disk, default) or "remote" (theme asset)"""
+        if backup in (None, "none") or not self.config.get("backup_enabled", True):
+            return True
+        if backup == "local":
+            return self.backup_faq_data_local(self._faq_raw)
+        if backup == "remote":
+            return self.backup_faq_data(self._faq_raw)
+        raise ValueError(f"Unknown backup mode: {backup!r} (expected 'none', 'local' or 'remote')")
+    
+    def update_faq_data(self, faq_data: Dict) -> bool:
+        """Replace the FAQ asset on Shopify with the given data"""
+        updated_faq_json_str = _dumps(faq_data)
+        
+        update_payload = {
+            "asset": {
+                "key": self.file_path,
+                "value": updated_faq_json_str
+            }
+        }
+        
+        try:
+            response = self.session.put(self.rest_url, json=update_payload)
+            response.raise_for_status()
+            
+            self._set_faq_cache(faq_data, updated_faq_json_str)
+            print("✅ FAQ data updated on Shopify")
+            return True
+            
+        except requests.RequestException as e:
+            print(f"❌ Error updating FAQ: {e}")
+            self.invalidate_faq_cache()
+            return False
+    
+    def _apply_add(self, faq_data: Dict, target_section_id: str, item: Dict) -> Dict:
+        """Add one question block to faq_data in memory (the section must exist)"""
+        section = faq_data["sections"][target_section_id]
+        
+        # Create new question block
+        new_block_id = str(uuid.uuid4())
+        section["blocks"][new_block_id] = {
+            "type": "question",
+            "settings": {
+                "question_handle": item["question_handle"],
+                "heading": item["heading"],
+                "question_content": item["content"]
+            }
+        }
+        section["block_order"].append(new_block_id)
+        
+        # Update category and icon if provided
+        if item.get("category"):
+            section["settings"]["question_category"] = item["category"]
+        if item.get("icon"):
+            section["settings"]["icon-faq"] = item["icon"]
+        
+        return faq_data
+    
+    def _build_handle_index(self, section: Dict) -> Dict[str, str]:
+        """Map question_handle -> block ID for the question blocks of a section (first match wins)"""
+        handle_index = {}
+        for block_id, block_data in section.get("blocks", {}).items():
+            if block_data.get("type") == "question":
+                handle_index.setdefault(block_data.get("settings", {}).get("question_handle"), block_id)
+        return handle_index
+    
+    def _apply_remove(self, faq_data: Dict, target_section_id: str, question_handle: str) -> Optional[str]:
+        """Remove one question block from faq_data in memory, returning its block ID if found"""
+        section = faq_data["sections"].get(target_section_id, {})
+        blocks = section.get("blocks", {})
+        block_order = section.get("block_order", [])
+        
+        block_to_remove = None
+        for block_id, block_data in blocks.items():
+            if (block_data.get("type") == "question" and 
+                block_data.get("settings", {}).get("question_handle") == question_handle):
+                block_to_remove = block_id
+                break
+        
+        if not block_to_remove:
+            return None
+        
+        # Remove from blocks and block_order
+        del blocks[block_to_remove]
+        if block_to_remove in block_order:
+            block_order.remove(block_to_remove)
+        
+        return block_to_remove
+    
     def add_faq_question(self, 
                         question_handle: str,
                         heading: str, 
                         content: str,
                         category: str = None,
                         icon: str = None,
-                        section_id: str = None) -> bool:
+                        section_id: str = None,
+                        backup: Optional[str] = "local") -> bool:
         """Add a new FAQ question to the specified section"""
         
         # Use provided section_id or default from config
@@ -88,24 +264,9 @@ class ShopifyFAQClient:
         if not faq_data:
             return False
         
-        # Get original JSON string for backup
-        faq_json_str = json.dumps(faq_data, ensure_ascii=False)
-        
-        # Create backup if enabled
-        if self.config.get("backup_enabled", True):
-            if not self.backup_faq_data(faq_json_str):
-                print("⚠️  Failed to create backup, continuing anyway...")
-        
-        # Create new question block
-        new_block_id = str(uuid.uuid4())
-        new_block = {
-            "type": "question",
-            "settings": {
-                "question_handle": question_handle,
-                "heading": heading,
-                "question_content": content
-            }
-        }
+        # Create backup if enabled, from the asset text as received (no re-encoding)
+        if not self._create_backup(backup):
+            print("⚠️  Failed to create backup, continuing anyway...")
         
         # Check if section exists
         if target_section_id not in faq_data.get("sections", {}):
@@ -113,35 +274,55 @@ class ShopifyFAQClient:
             return False
         
         # Add the new block
-        faq_data["sections"][target_section_id]["blocks"][new_block_id] = new_block
-        faq_data["sections"][target_section_id]["block_order"].append(new_block_id)
+        self._apply_add(faq_data, target_section_id, {
+            "question_handle": question_handle,
+            "heading": heading,
+            "content": content,
+            "category": category,
+            "icon": icon
+        })
         
-        # Update category and icon if provided
-        if category:
-            faq_data["sections"][target_section_id]["settings"]["question_category"] = category
-        if icon:
-            faq_data["sections"][target_section_id]["settings"]["icon-faq"] = icon
-        
-        # Convert back to JSON and update Shopify
-        updated_faq_json_str = json.dumps(faq_data, ensure_ascii=False)
+        if not self.update_faq_data(faq_data):
+            return False
         
-        update_payload = {
-            "asset": {
-                "key": self.file_path,
-                "value": updated_faq_json_str
-            }
-        }
+        print(f"✅ FAQ question added successfully: {heading}")
+        return True
+    
+    def bulk_add_faq_questions(self, items: List[Dict], backup: Optional[str] = "remote") -> bool:
+        """Add several FAQ questions with one read, one backup and one update
         
-        try:
-            response = requests.put(self.rest_url, headers=self.headers, json=update_payload)
-            response.raise_for_status()
-            
-            print(f"✅ FAQ question added successfully: {heading}")
+        Each item has question_handle, heading, content and optionally category,
+        icon and section_id (defaults to the configured section). Nothing is
+        written if a target section is missing; if the final update fails, the
+        backup created just before holds the previous state to restore from.
+        """
+        if not items:
             return True
-            
-        except requests.RequestException as e:
-            print(f"❌ Error updating FAQ: {e}")
+        
+        faq_data = self.get_faq_data()
+        if not faq_data:
+            return False
+        
+        # Check every target section before touching the data
+        sections = faq_data.get("sections", {})
+        for item in items:
+            target_section_id = item.get("section_id") or self.section_id
+            if target_section_id not in sections:
+                print(f"❌ Section {target_section_id} not found in FAQ data")
+                return False
+        
+        # One backup for the whole batch
+        if not self._create_backup(backup):
+            print("⚠️  Failed to create backup, continuing anyway...")
+        
+        for item in items:
+            self._apply_add(faq_data, item.get("section_id") or self.section_id, item)
+        
+        if not self.update_faq_data(faq_data):
             return False
+        
+        print(f"✅ {len(items)} FAQ questions added")
+        return True
     
     def list_faq_questions(self) -> List[Dict]:
         """List all current FAQ questions"""        
@@ -173,7 +354,8 @@ class ShopifyFAQClient:
         print(f"📋 Available sections: {sections}")
         return sections
     
-    def remove_faq_question(self, question_handle: str, section_id: str = None) -> bool:
+    def remove_faq_question(self, question_handle: str, section_id: str = None,
+                            backup: Optional[str] = "local") -> bool:
         """Remove a FAQ question by its handle"""
         # Use provided section_id or default from config
         target_section_id = section_id or self.section_id
@@ -182,52 +364,66 @@ class ShopifyFAQClient:
         if not faq_data:
             return False
         
-        # Create backup
-        faq_json_str = json.dumps(faq_data, ensure_ascii=False)
-        if self.config.get("backup_enabled", True):
-            self.backup_faq_data(faq_json_str)
+        # Create backup, from the asset text as received (no re-encoding)
+        self._create_backup(backup)
         
         # Find and remove the question
-        section = faq_data["sections"].get(target_section_id, {})
-        blocks = section.get("blocks", {})
-        block_order = section.get("block_order", [])
-        
-        block_to_remove = None
-        for block_id, block_data in blocks.items():
-            if (block_data.get("type") == "question" and 
-                block_data.get("settings", {}).get("question_handle") == question_handle):
-                block_to_remove = block_id
-                break
-        
-        if not block_to_remove:
+        if not self._apply_remove(faq_data, target_section_id, question_handle):
             print(f"❌ Question with handle '{question_handle}' not found in section {target_section_id}")
             return False
         
-        # Remove from blocks and block_order
-        del faq_data["sections"][target_section_id]["blocks"][block_to_remove]
-        if block_to_remove in block_order:
-            faq_data["sections"][target_section_id]["block_order"].remove(block_to_remove)
-        
         # Update Shopify
-        updated_faq_json_str = json.dumps(faq_data, ensure_ascii=False)
+        if not self.update_faq_data(faq_data):
+            return False
         
-        update_payload = {
-            "asset": {
-                "key": self.file_path,
-                "value": updated_faq_json_str
-            }
-        }
+        print(f"✅ FAQ question removed: {question_handle}")
+        return True
+    
+    def bulk_remove_faq_questions(self, question_handles: List[str], section_id: str = None,
+                                  backup: Optional[str] = "remote") -> bool:
+        """Remove several FAQ questions with one read, one backup and one update
         
-        try:
-            response = requests.put(self.rest_url, headers=self.headers, json=update_payload)
-            response.raise_for_status()
-            
-            print(f"✅ FAQ question removed: {question_handle}")
+        Handles not found in the section are reported and skipped. If the final
+        update fails, the backup created just before holds the previous state
+        to restore from.
+        """
+        target_section_id = section_id or self.section_id
+        if not question_handles:
             return True
-            
-        except requests.RequestException as e:
-            print(f"❌ Error removing FAQ question: {e}")
+        
+        faq_data = self.get_faq_data()
+        if not faq_data:
+            return False
+        
+        # One backup for the whole batch
+        self._create_backup(backup)
+        
+        section = faq_data["sections"].get(target_section_id, {})
+        blocks = section.get("blocks", {})
+        
+        # One index build, then one dict lookup per handle
+        handle_index = self._build_handle_index(section)
+        removed = set()
+        for question_handle in question_handles:
+            block_id = handle_index.pop(question_handle, None)
+            if block_id is None:
+                print(f"⚠️  Question with handle '{question_handle}' not found in section {target_section_id}")
+                continue
+            del blocks[block_id]
+            removed.add(block_id)
+        
+        if not removed:
             return False
+        
+        # Filter block_order once instead of one list.remove per handle
+        if "block_order" in section:
+            section["block_order"] = [block_id for block_id in section["block_order"] if block_id not in removed]
+        
+        if not self.update_faq_data(faq_data):
+            return False
+        
+        print(f"✅ {len(removed)} FAQ questions removed")
+        return True
 
 
 if __name__ == "__main__":